@@ -8,6 +8,8 @@ import io
 
 from dotenv import load_dotenv
 
+from profiling import profile_stage
+
 # Load environment variables
 load_dotenv()
 
@@ -20,6 +22,7 @@ def encode_image_to_base64(image_path):
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
+@profile_stage
 def detect_ingredients(image_path):
     """Detect ingredients in an image using ChatGPT Vision API"""
     print(f"[INFO] Detecting ingredients from: {image_path}")
@@ -123,6 +126,7 @@ def detect_ingredients(image_path):
         return []
 
 
+@profile_stage
 def substitute_objects(image_path, detections, output_path, placeholder_path="static/placeholder.jpg"):
     """Highlight detected ingredients in the image"""
     
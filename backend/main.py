@@ -4,6 +4,7 @@ from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
 from imagerecognition import detect_ingredients, substitute_objects
+from profiling import ProfilingMiddleware, profile_stage, profiled, router as profiling_router
 import os
 import shutil
 import cv2
@@ -19,7 +20,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Profile-Id", "X-Profile-Url"],
 )
+app.add_middleware(ProfilingMiddleware)
+app.include_router(profiling_router)
 
 STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
 os.makedirs(STATIC_DIR, exist_ok=True)
@@ -32,6 +36,7 @@ def skip_special_tokens(text, special_tokens):
         text = text.replace(token, "")
     return text
 
+@profile_stage
 def target_postprocessing(texts, special_tokens):
     if not isinstance(texts, list):
         texts = [texts]
@@ -43,6 +48,7 @@ def target_postprocessing(texts, special_tokens):
         new_texts.append(text)
     return new_texts
 
+@profile_stage
 def build_prompt(ingredients, cuisine=None, allergies=None, max_time=None):
     prompt = "Remove serving number from directions " +"items: " + ", ".join(ingredients)
     if cuisine and cuisine.lower() != "any":
@@ -53,6 +59,7 @@ def build_prompt(ingredients, cuisine=None, allergies=None, max_time=None):
         prompt += f" | max_time: {max_time} mins"
     return prompt
 
+@profile_stage
 def generate_recipe(text):
     inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True)
     output_ids = model.generate(
@@ -77,6 +84,7 @@ class RecipeRequest(BaseModel):
     source: str = "AI"
 
 @app.post("/generate")
+@profiled
 def generate(req: RecipeRequest):
     ingredients_list = [item.strip().lower() for item in req.ingredients.split(',') if item.strip()]
     allergies = req.allergies.strip().lower() if req.allergies else ""
@@ -116,6 +124,7 @@ def generate(req: RecipeRequest):
     return {"ai_recipes": generated_recipes}
 
 @app.post("/detect-ingredients")
+@profiled
 async def detect(file: UploadFile = File(...)):
     os.makedirs(STATIC_DIR, exist_ok=True)
 
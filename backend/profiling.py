@@ -0,0 +1,257 @@
+import cProfile
+import functools
+import hmac
+import inspect
+import io
+import os
+import pstats
+import threading
+import time
+import uuid
+import zipfile
+from contextvars import ContextVar
+
+from dotenv import load_dotenv
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import torch
+    from torch.profiler import ProfilerActivity, profile as torch_profile
+except ImportError:
+    torch = None
+
+# Load environment variables
+load_dotenv()
+
+# Profiling is disabled entirely unless a token is configured
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILE_HEADER = "x-profile-token"
+PROFILED_PATHS = {"/generate", "/detect-ingredients"}
+PROFILE_DIR = os.path.join(os.path.dirname(__file__), "profiles")
+MAX_PROFILES = 20
+
+_session = ContextVar("profile_session", default=None)
+_busy = threading.Lock()
+_armed = threading.Event()
+
+
+def _token_ok(token):
+    if not PROFILING_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), PROFILING_TOKEN.encode("utf-8"))
+
+
+def _prune_profiles():
+    """Keep only the MAX_PROFILES most recent artifacts"""
+    artifacts = [os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR) if name.endswith(".zip")]
+    artifacts.sort(key=os.path.getmtime, reverse=True)
+    for path in artifacts[MAX_PROFILES:]:
+        os.remove(path)
+
+
+class ProfileSession:
+    """Collects a cProfile, per-stage timings and torch operator timings for one request"""
+
+    def __init__(self, path):
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.stages = []
+        self.started = False
+        self.saved = False
+        self.on_event_loop = False
+        self._profiler = cProfile.Profile()
+        self._torch = None
+
+    def start(self):
+        if torch is not None:
+            activities = [ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(ProfilerActivity.CUDA)
+            self._torch = torch_profile(activities=activities)
+            self._torch.__enter__()
+        self._profiler.enable()
+        self.started = True
+
+    def stop(self):
+        self._profiler.disable()
+        if self._torch is not None:
+            try:
+                self._torch.__exit__(None, None, None)
+            except Exception as e:
+                print(f"[ERROR] Stopping torch profiler failed: {str(e)}")
+                self._torch = None
+
+    def finish(self):
+        """Save the profile without letting a failure affect the profiled request"""
+        try:
+            self.save()
+            self.saved = True
+        except Exception as e:
+            print(f"[ERROR] Saving profile {self.id} failed: {str(e)}")
+
+    def save(self):
+        """Write the profile as a zip holding the raw .prof, a text summary and torch op timings"""
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+
+        summary = io.StringIO()
+        summary.write(f"path: {self.path}\n")
+        if self.on_event_loop:
+            summary.write("note: async endpoint profiled on the event loop; may include other requests\n")
+        summary.write("\n[STAGES]:\n")
+        for name, elapsed in self.stages:
+            summary.write(f"  - {name}: {elapsed * 1000:.1f} ms\n")
+        summary.write("\n")
+        pstats.Stats(self._profiler, stream=summary).sort_stats("cumulative").print_stats(50)
+
+        prof_path = os.path.join(PROFILE_DIR, f"{self.id}.prof")
+        self._profiler.dump_stats(prof_path)
+
+        with zipfile.ZipFile(self.artifact_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.write(prof_path, "request.prof")
+            archive.writestr("summary.txt", summary.getvalue())
+            if self._torch is not None:
+                table = self._torch.key_averages().table(sort_by="self_cpu_time_total", row_limit=50)
+                archive.writestr("torch_ops.txt", table)
+        os.remove(prof_path)
+        _prune_profiles()
+        print(f"[INFO] Profile saved to: {self.artifact_path}")
+
+    @property
+    def artifact_path(self):
+        return os.path.join(PROFILE_DIR, f"{self.id}.zip")
+
+
+def profile_stage(func):
+    """Record wall time of a hot-path function when the current request is being profiled"""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        session = _session.get()
+        if session is None:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            session.stages.append((func.__name__, time.perf_counter() - start))
+
+    return wrapper
+
+
+def profiled(endpoint):
+    """Run an endpoint under the profiler when the middleware sampled the request.
+
+    The profiler is enabled here rather than in the middleware so that it runs
+    in the same thread as the endpoint (sync endpoints execute in a threadpool).
+    For async endpoints the artifact is written from the threadpool so the
+    event loop is not blocked.
+    """
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            session = _session.get()
+            if session is None:
+                return await endpoint(*args, **kwargs)
+            session.on_event_loop = True
+            session.start()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                session.stop()
+                await run_in_threadpool(session.finish)
+
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        session = _session.get()
+        if session is None:
+            return endpoint(*args, **kwargs)
+        session.start()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            session.stop()
+            session.finish()
+
+    return wrapper
+
+
+class ProfilingMiddleware:
+    """Sample at most one request at a time for profiling.
+
+    A request is profiled when it carries a valid X-Profile-Token header, or
+    when the next request has been armed through /admin/profile/arm. Once an
+    artifact has been saved, its id and download URL are returned in
+    X-Profile-Id / X-Profile-Url.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not PROFILING_TOKEN or scope["type"] != "http" or scope["path"] not in PROFILED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        token = headers.get(PROFILE_HEADER.encode(), b"").decode("latin-1")
+        by_token = _token_ok(token)
+        if not (by_token or _armed.is_set()) or not _busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        used_arm = not by_token and _armed.is_set()
+        if used_arm:
+            _armed.clear()
+        session = ProfileSession(scope["path"])
+        reset = _session.set(session)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and session.saved:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", session.id.encode()),
+                    (b"x-profile-url", f"/admin/profiles/{session.id}".encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _session.reset(reset)
+            if used_arm and not session.started:
+                # The endpoint never ran (validation or routing failed), keep the sample armed
+                _armed.set()
+            _busy.release()
+
+
+router = APIRouter(prefix="/admin")
+
+
+@router.post("/profile/arm")
+def arm_profile(x_profile_token: str = Header(None)):
+    """Profile the next /generate or /detect-ingredients request"""
+    if not _token_ok(x_profile_token):
+        raise HTTPException(status_code=404)
+    _armed.set()
+    return {"armed": True}
+
+
+@router.get("/profiles/{profile_id}")
+def download_profile(profile_id: str, x_profile_token: str = Header(None)):
+    """Download a saved profile artifact"""
+    if not _token_ok(x_profile_token):
+        raise HTTPException(status_code=404)
+    try:
+        valid = uuid.UUID(hex=profile_id).hex == profile_id
+    except ValueError:
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=404)
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.zip")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404)
+    return FileResponse(path, media_type="application/zip", filename=f"profile_{profile_id}.zip")